@@ -1,10 +1,22 @@
 import streamlit as st
-from utils import inject_custom_css, get_video_id, run_analysis_and_summarize, save_to_pdf
+from utils import inject_custom_css, get_video_id, run_analysis_and_summarize, save_to_pdf, EmptySectionsError
 from pathlib import Path
 from io import BytesIO 
 import json 
+import os
 from typing import List, Dict, Any, Optional
 import re 
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Set NOTES_DEBUG=1 to show the on-screen debug panels and emit debug logs from this app and utils
+DEBUG_MODE = bool(os.environ.get("NOTES_DEBUG"))
+if DEBUG_MODE:
+    logging.basicConfig()
+    for debug_logger_name in (__name__, "utils"):
+        logging.getLogger(debug_logger_name).setLevel(logging.DEBUG)
 
 # Call the CSS injection function (for base styling)
 inject_custom_css()
@@ -38,11 +50,19 @@ TIME_MODE_DIVISION_MAP = {
     "Detailed": 6
 }
 
+# [MM:SS] / [HH:MM:SS] markers (brackets optional) that start each transcript segment
+TIMESTAMP_RE = re.compile(r'\[?(\d{1,2}:\d{2}(?::\d{2})?)\]?')
+
 # --- Application Setup ---
 st.title("📹 AI-Powered Hyperlinked Video Notes Generator")
 
 # --- Model Context Constants ---
 WARNING_THRESHOLD_CHARS = 300000 
+# Largest transcript slice sent in one request (~250k tokens); longer transcripts get extra parts
+MAX_PART_CHARS = 1000000
+
+# Transcript parts are independent requests; cap how many are in flight at once
+MAX_PARALLEL_REQUESTS = 4
 
 # Initialize session state variables
 if 'analysis_data' not in st.session_state:
@@ -70,24 +90,30 @@ if 'settings_mode' not in st.session_state:
 
 # --- 🔧 CORE HELPER FUNCTIONS ---
 
+def timestamp_to_seconds(timestamp: str) -> int:
+    """Convert "MM:SS" or "HH:MM:SS" to whole seconds"""
+    seconds = 0
+    for unit in timestamp.split(':'):
+        seconds = seconds * 60 + int(unit)
+    return seconds
+
 def preprocess_transcript(text):
-    # (Implementation remains unchanged)
-    import re
-    pattern = r'\[?(\d{1,2}:\d{2}(?::\d{2})?)\]?' 
-    matches = list(re.finditer(pattern, text))
-    segments = []
+    matches = list(TIMESTAMP_RE.finditer(text))
     
     if not matches:
          if text:
-             return [{"time": "00:00", "text": text.strip()}]
+             return [{"time": 0, "text": text.strip()}]
          return []
 
-    for i in range(len(matches)):
-        start = matches[i].end()
-        end = matches[i+1].start() if i + 1 < len(matches) else len(text)
-        ts = matches[i].group(1)
-        segments.append({"time": ts, "text": text[start:end].strip()})
-        
+    # Each segment runs from the end of its timestamp to the start of the next one;
+    # times are int seconds (what the prompt and PDF links expect), empty segments are dropped
+    segment_ends = [match.start() for match in matches[1:]]
+    segment_ends.append(len(text))
+    segments = []
+    for match, end in zip(matches, segment_ends):
+        segment_text = text[match.end():end].strip()
+        if segment_text:
+            segments.append({"time": timestamp_to_seconds(match.group(1)), "text": segment_text})
     return segments
 
 def split_transcript_by_parts(transcript: str, num_parts: int) -> List[str]:
@@ -144,6 +170,13 @@ def merge_all_json_outputs(results: List[Dict[str, Any]]) -> Dict[str, Any]:
             
     return combined
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def render_pdf_bytes(data: Dict[str, Any], video_id: Optional[str], format_choice: str) -> bytes:
+    """Render notes to PDF bytes; cached so Streamlit reruns don't rebuild unchanged PDFs"""
+    pdf_output = BytesIO()
+    save_to_pdf(data, video_id, Path(__file__).parent, pdf_output, format_choice)
+    return pdf_output.getvalue()
+
 # --------------------------------------------------------------------------
 # --- Sidebar Setup and Conditional Logic ---
 # --------------------------------------------------------------------------
@@ -334,14 +367,11 @@ is_easy_read = format_choice.startswith("Easier Read")
 
 if run_analysis and not st.session_state['processing']:
     
-    # Print the active configuration for debugging
-    print(f"\n--- DEBUG RUN START ---")
-    print(f"| Settings Mode: {settings_mode}")
-    print(f"| Final Max Words: {final_max_words}")
-    print(f"| Final Divisions: {final_num_divisions}")
-    print(f"| Model: {model_choice}")
-    print(f"| Video ID: {video_id}")
-    print(f"--- DEBUG RUN END ---")
+    # Log the active configuration for debugging (arguments are only formatted when DEBUG is on)
+    logger.debug(
+        "Run config | Settings Mode: %s | Final Max Words: %s | Final Divisions: %s | Model: %s | Video ID: %s",
+        settings_mode, final_max_words, final_num_divisions, model_choice, video_id
+    )
     
     st.session_state['processing'] = True
     st.session_state['chunked_results'] = []
@@ -356,51 +386,84 @@ if run_analysis and not st.session_state['processing']:
         num_parts_to_use = 1 
         if model_choice == "gemini-2.5-flash":
             num_parts_to_use = final_num_divisions
+        # Never send a single oversized prompt, whatever the model or division setting
+        num_parts_to_use = max(num_parts_to_use, -(-len(transcript_text) // MAX_PART_CHARS))
         
         transcript_parts = split_transcript_by_parts(transcript_text, num_parts_to_use)
         
-        st.info(f"Analyzing in **{len(transcript_parts)}** sequential part(s) using **{model_choice}** (Divisions: {num_parts_to_use}).")
+        st.info(f"Analyzing **{len(transcript_parts)}** part(s) in parallel using **{model_choice}** (Divisions: {num_parts_to_use}).")
 
         # Chunked Execution
         status_bar = st.progress(0, text="Starting analysis...")
         
         sections_list_keys = [LABEL_TO_KEY.get(lbl, lbl) for lbl in sections_list]
+        preprocessed_parts = [preprocess_transcript(part) for part in transcript_parts]
+        part_results: List[Optional[Dict[str, Any]]] = [None] * len(preprocessed_parts)
+        analysis_failed = False
+        skipped_parts = 0
 
-        for i, part in enumerate(transcript_parts, start=1):
-            status_bar.progress(
-                i / len(transcript_parts), 
-                text=f'Analyzing Part {i} of {len(transcript_parts)}... (Model: {model_choice})'
-            )
-            
-            preprocessed_part = preprocess_transcript(part)
+        # Parts don't depend on each other, so submit them together instead of one round-trip at a time
+        executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_REQUESTS, len(preprocessed_parts)))
+        try:
+            futures = {
+                executor.submit(
+                    run_analysis_and_summarize,
+                    api_key, preprocessed_part, final_max_words, sections_list_keys, user_prompt_input, model_choice, is_easy_read
+                ): i
+                for i, preprocessed_part in enumerate(preprocessed_parts, start=1)
+            }
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                status_bar.progress(
+                    done / len(preprocessed_parts), 
+                    text=f'Analyzed {done} of {len(preprocessed_parts)} parts... (Model: {model_choice})'
+                )
 
-            data_json, error_msg, full_prompt = run_analysis_and_summarize(
-                api_key, preprocessed_part, final_max_words, sections_list_keys, user_prompt_input, model_choice, is_easy_read
-            )
-            
-            # --- DEBUG: Raw Response Inspection ---
-            if error_msg:
-                # If JSON parsing failed, the error_msg is the most immediate indicator of the raw output problem
-                debug_messages.append(f"🛑 **DEBUG Part {i} API Error:** {error_msg}")
-                debug_messages.append(f"Check the console for the full prompt/raw response text.")
-            
-            if data_json:
-                st.session_state['chunked_results'].append(data_json)
-                debug_messages.append(f"✅ **DEBUG Part {i} Success:** Extracted keys: {list(data_json.keys())}")
-            else:
-                st.error(f"Analysis failed for Part {i}. Error: {error_msg}")
-                st.session_state['chunked_results'] = []
-                break
+                try:
+                    data_json, error_msg, full_prompt = future.result()
+                except EmptySectionsError:
+                    # One empty slice shouldn't discard the other parts; it's simply left out of the results
+                    st.warning(f"Part {i} had no notes to extract and was skipped.")
+                    skipped_parts += 1
+                    continue
                 
-            debug_placeholder.info("\n".join(debug_messages))
-            # --- END DEBUG ---
-
+                # --- DEBUG: Raw Response Inspection ---
+                if DEBUG_MODE and error_msg:
+                    # If JSON parsing failed, the error_msg is the most immediate indicator of the raw output problem
+                    debug_messages.append(f"🛑 **DEBUG Part {i} API Error:** {error_msg}")
+                    debug_messages.append(f"Check the console for the full prompt/raw response text.")
+                
+                if data_json:
+                    part_results[i - 1] = data_json
+                    if DEBUG_MODE:
+                        debug_messages.append(f"✅ **DEBUG Part {i} Success:** Extracted keys: {list(data_json.keys())}")
+                else:
+                    st.error(f"Analysis failed for Part {i}. Error: {error_msg}")
+                    analysis_failed = True
+                    break
+                    
+                if debug_messages:
+                    debug_placeholder.info("\n".join(debug_messages))
+                # --- END DEBUG ---
+        finally:
+            # Stop as soon as a part fails: drop queued parts and don't block on in-flight calls
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Keep results in transcript order regardless of completion order, dropping skipped parts
+        st.session_state['chunked_results'] = [] if analysis_failed else [r for r in part_results if r]
+        if not analysis_failed and not st.session_state['chunked_results']:
+            st.error("Analysis failed: every part returned all-empty sections; retry with a different prompt.")
 
         status_bar.empty()
         debug_placeholder.empty() # Clear transient debug messages on completion
 
         if st.session_state['chunked_results']:
-            st.success(f"Analysis complete for all {len(st.session_state['chunked_results'])} parts.")
+            analyzed_parts = len(st.session_state['chunked_results'])
+            if skipped_parts:
+                st.success(f"Analysis complete: {analyzed_parts} part(s) analyzed, {skipped_parts} skipped with no notes to extract.")
+            else:
+                st.success(f"Analysis complete for all {analyzed_parts} parts.")
             st.session_state['pdf_ready'] = True
         else:
             st.session_state['pdf_ready'] = False
@@ -422,35 +485,33 @@ if st.session_state['chunked_results']:
         help="You can merge all analyzed chunks into a single hyperlinked PDF, or keep each chunk's output separate."
     )
 
-    current_dir = Path(__file__).parent
-
     if combine_choice.startswith("🔗"):
         st.subheader("Single Merged PDF")
         
         combined_data = merge_all_json_outputs(st.session_state['chunked_results'])
         
         # 🧠 DEBUG 2 & 3: Final merged output check
-        st.write("🧠 DEBUG: Final merged JSON keys (check for expected keys and list lengths):")
-        
-        data = combined_data
-        # FIX: Remove invalid escape sequence \_
-        st.write("**main_subject**:", data.get("main_subject"))
-        
-        # Check list keys
-        for k, v in data.items():
-            if isinstance(v, list) and k != "main_subject":
-                # FIX: Remove invalid escape sequence \_
-                st.write(f"**{k}**:", len(v))
+        if DEBUG_MODE:
+            st.write("🧠 DEBUG: Final merged JSON keys (check for expected keys and list lengths):")
+            
+            data = combined_data
+            # FIX: Remove invalid escape sequence \_
+            st.write("**main_subject**:", data.get("main_subject"))
+            
+            # Check list keys
+            for k, v in data.items():
+                if isinstance(v, list) and k != "main_subject":
+                    # FIX: Remove invalid escape sequence \_
+                    st.write(f"**{k}**:", len(v))
         
-        pdf_output = BytesIO()
         try:
             with st.spinner("Generating combined PDF..."):
-                # 🧠 DEBUG 4: save_to_pdf is called here
-                save_to_pdf(combined_data, video_id, current_dir, pdf_output, format_choice)
+                # 🧠 DEBUG 4: save_to_pdf is called here (via the cached renderer)
+                pdf_bytes = render_pdf_bytes(combined_data, video_id, format_choice)
             
             st.download_button(
                 label=f"⬇️ Download Merged Notes: {output_filename_base}.pdf",
-                data=pdf_output,
+                data=pdf_bytes,
                 file_name=output_filename, 
                 mime="application/pdf" 
             )
@@ -463,16 +524,14 @@ if st.session_state['chunked_results']:
         st.info("Each part represents a section of the original transcript.")
 
         for i, part_data in enumerate(st.session_state['chunked_results'], start=1):
-            pdf_output = BytesIO()
-            
             try:
                 with st.spinner(f"Preparing Part {i}..."):
-                    # 🧠 DEBUG 4: save_to_pdf is called here
-                    save_to_pdf(part_data, video_id, current_dir, pdf_output, format_choice)
+                    # 🧠 DEBUG 4: save_to_pdf is called here (via the cached renderer)
+                    pdf_bytes = render_pdf_bytes(part_data, video_id, format_choice)
                 
                 st.download_button(
                     label=f"⬇️ Download Part {i}",
-                    data=pdf_output,
+                    data=pdf_bytes,
                     # FIX: Corrected incomplete file_name string
                     file_name=f"{output_filename_base}_part{i}.pdf",
                     mime="application/pdf",
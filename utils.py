@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
+import functools
+import hashlib
 import json
+import logging
 import re
+import tempfile
+import threading
 from pathlib import Path
-import google.generativeai as genai
+from urllib.parse import urlparse, parse_qs
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
@@ -12,10 +17,25 @@ from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
 from reportlab.lib.colors import HexColor, white
 from reportlab.platypus.flowables import Flowable
 from reportlab.pdfgen import canvas as pdfcanvas
+import diskcache
 from io import BytesIO
 import time
 from typing import Optional, Tuple, Dict, Any, List
 
+logger = logging.getLogger(__name__)
+
+# orjson parses/serialises several times faster; its JSONDecodeError subclasses json's
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps_bytes = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    
+    def json_dumps_bytes(obj) -> bytes:
+        """Compact UTF-8 JSON, matching orjson.dumps output"""
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
 # --- MODERN COLOR PALETTE ---
 COLORS = {
     # Primary palette (vibrant & professional)
@@ -34,10 +54,14 @@ COLORS = {
     "bg_highlight": HexColor("#FFF59D"),  # Yellow highlight
     "bg_card": HexColor("#FAFAFA"),       # Off-white card
     
-    # Link color
+    # Link & highlight text colors
     "link": HexColor("#1976D2"),          # Blue link
+    "highlight_text": HexColor("#E65100"),  # Deep orange highlighted words
 }
 
+# Palette as "#RRGGBB" strings for Paragraph markup, formatted once at import
+MARKUP_COLORS = {name: "#" + color.hexval()[2:].upper() for name, color in COLORS.items()}
+
 # Section icons/emojis
 SECTION_ICONS = {
     "topic_breakdown": "📚",
@@ -59,6 +83,39 @@ EXPECTED_KEYS = [
     "key_points", "short_tricks", "must_remembers" 
 ]
 
+# Expected keys in the spellings the model actually returns -> snake_case
+SNAKE_CASE_KEYS = {
+    spelling: key
+    for key in EXPECTED_KEYS
+    for pascal in [key.title().replace("_", "")]
+    for spelling in (key, pascal, pascal[0].lower() + pascal[1:])
+}
+
+# Item fields checked (in priority order) for an item's display text
+CONTENT_KEYS = (
+    'detail', 'explanation', 'point', 'text', 'definition',
+    'formula_or_principle', 'insight', 'mistake', 'content'
+)
+
+# (heading, icon) per section, computed once so each PDF section is a single lookup
+SECTION_LABELS = {
+    key: (key.replace("_", " ").title(), SECTION_ICONS.get(key, "📌"))
+    for key in EXPECTED_KEYS if key != "main_subject"
+}
+
+# URL shapes handled by get_video_id's urlparse fast path
+YOUTUBE_HOSTS = {"www.youtube.com", "youtube.com", "m.youtube.com"}
+YOUTUBE_PATH_PREFIXES = {"embed", "shorts", "live"}
+
+# Shared decoder for pulling a JSON object out of surrounding text (raw_decode)
+JSON_DECODER = json.JSONDecoder()
+
+# Precompiled patterns (hot paths: every URL, every response, every PDF item)
+VIDEO_ID_RE = re.compile(r"(?:v=|be/|live/|embed/|shorts/)([^&#?]+)")
+JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+CAMEL_WORD_RE = re.compile(r'(.)([A-Z][a-z]+)')
+CAMEL_BOUNDARY_RE = re.compile(r'([a-z0-9])([A-Z])')
+
 # Improved System Prompt
 SYSTEM_PROMPT = """
 You are an expert academic content analyzer. Extract structured study notes from video transcripts.
@@ -87,6 +144,15 @@ RULES:
 5. Fill ALL requested sections with available content
 """
 
+# Ask Gemini for raw JSON so responses arrive without markdown fences or preamble
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+
+# Per-format rule appended to SYSTEM_PROMPT, keyed by is_easy_read
+HIGHLIGHTING_INSTRUCTIONS = {
+    True: "4. **Highlighting:** Wrap 2-4 critical words in <hl>text</hl> tags.",
+    False: "4. **NO special tags:** Use plain text only.",
+}
+
 # --- UTILITY FUNCTIONS ---
 
 def inject_custom_css():
@@ -118,20 +184,32 @@ def inject_custom_css():
 
 def get_video_id(url: str) -> Optional[str]:
     """Extract YouTube video ID"""
-    patterns = [
-        r"(?<=v=)[^&#?]+", r"(?<=be/)[^&#?]+", r"(?<=live/)[^&#?]+",
-        r"(?<=embed/)[^&#?]+", r"(?<=shorts/)[^&#?]+"
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(0)
-    return None
+    # Fast path: one urlparse for the standard URL shapes
+    try:
+        parsed = urlparse(url)
+        if parsed.hostname in YOUTUBE_HOSTS:
+            video_ids = parse_qs(parsed.query).get('v')
+            if video_ids:
+                return video_ids[0]
+            parts = parsed.path.strip('/').split('/', 1)
+            if parts[0] in YOUTUBE_PATH_PREFIXES and len(parts) > 1 and parts[1]:
+                return parts[1].split('/', 1)[0]
+        elif parsed.hostname == "youtu.be" and parsed.path.strip('/'):
+            return parsed.path.strip('/').split('/', 1)[0]
+    except ValueError:
+        pass
+    
+    # Fallback for scheme-less or otherwise non-standard URLs
+    match = VIDEO_ID_RE.search(url)
+    return match.group(1) if match else None
 
 def extract_gemini_text(response) -> Optional[str]:
     """Extract text from Gemini API response"""
-    if hasattr(response, 'text'):
+    try:
         return response.text
+    except (AttributeError, ValueError):
+        # ValueError: the SDK's .text accessor raises when a candidate has no text parts
+        pass
     if hasattr(response, 'candidates') and response.candidates:
         try:
             return response.candidates[0].content.parts[0].text
@@ -139,118 +217,265 @@ def extract_gemini_text(response) -> Optional[str]:
             pass
     return None
 
-def extract_clean_json(response_text: str) -> Optional[str]:
-    """Extract JSON from response with markdown cleanup"""
-    cleaned = re.sub(r'```json\s*|\s*```', '', response_text)
-    match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-    if match:
-        json_str = match.group(0)
-        try:
-            json.loads(json_str)
-            return json_str
-        except json.JSONDecodeError:
-            pass
-    return None
+class JsonObjectScanner:
+    """Track brace depth across streamed text to spot where the first JSON object closes"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape_pending = False
+    
+    def feed(self, text: str) -> int:
+        """Consume a chunk; return the index just past the closing brace, or -1 if still open"""
+        escaped_at = 0 if self.escape_pending else -1
+        # Only braces, quotes and backslashes matter, so jump straight between them
+        for match in JSON_STRUCTURE_RE.finditer(text):
+            i = match.start()
+            ch = text[i]
+            if self.in_string:
+                if i == escaped_at:
+                    continue
+                if ch == '\\':
+                    escaped_at = i + 1
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '{':
+                self.depth += 1
+                self.started = True
+            elif not self.started:
+                continue
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        self.escape_pending = escaped_at == len(text)
+        return -1
 
+def collect_streamed_text(response) -> Optional[str]:
+    """Join streamed response chunks, stopping once a complete top-level JSON object has arrived"""
+    scanner = JsonObjectScanner()
+    chunks = []
+    for chunk in response:
+        text = extract_gemini_text(chunk)
+        if not text:
+            continue
+        chunks.append(text)
+        if scanner.feed(text) != -1:
+            # Anything the model sends after the object is chatter we'd strip anyway
+            break
+    return "".join(chunks) or None
+
+def extract_json_object(response_text: str) -> Optional[Dict[str, Any]]:
+    """Parse the first JSON object in a response, ignoring markdown fences and surrounding chatter"""
+    start = response_text.find('{')
+    if start == -1:
+        return None
+    # raw_decode parses in place from the first '{' and stops at the object's end, so
+    # trailing chatter is ignored and the object is parsed once, not validated then re-parsed
+    try:
+        json_data, _ = JSON_DECODER.raw_decode(response_text, start)
+    except json.JSONDecodeError:
+        return None
+    return json_data
+
+@functools.lru_cache(maxsize=4096)
 def format_timestamp(seconds: int) -> str:
-    """Convert seconds to [MM:SS] or [HH:MM:SS]"""
-    seconds = int(seconds)
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    secs = seconds % 60
-    
-    if hours > 0:
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
-    return f"{minutes:02d}:{secs:02d}"
+    """Convert seconds to [MM:SS] or [HH:MM:SS] (pass an int so cache keys stay consistent)"""
+    if seconds < 3600:
+        minutes, secs = divmod(seconds, 60)
+        return f"{minutes:02d}:{secs:02d}"
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+def to_snake_case(s: str) -> str:
+    """Convert camelCase/PascalCase keys to snake_case"""
+    known = SNAKE_CASE_KEYS.get(s)
+    if known:
+        return known
+    s1 = CAMEL_WORD_RE.sub(r'\1_\2', s)
+    return CAMEL_BOUNDARY_RE.sub(r'\1_\2', s1).lower()
 
 def get_content_text(item):
     """Extract text content from various item structures"""
-    if isinstance(item, dict):
-        for key in ['detail', 'explanation', 'point', 'text', 'definition', 
-                    'formula_or_principle', 'insight', 'mistake', 'content']:
-            if key in item and item[key]:
-                return str(item[key])
+    if type(item) is dict:
+        for key in CONTENT_KEYS:
+            value = item.get(key)
+            if value:
+                return value if type(value) is str else str(value)
+        return ''
     return str(item) if item else ''
 
 # --- API INTERACTION ---
 
-@st.cache_data(ttl=0)
-def run_analysis_and_summarize(
-    api_key: str, 
-    transcript_segments: List[Dict], 
-    max_words: int, 
-    sections_list_keys: list, 
-    user_prompt: str, 
-    model_name: str, 
-    is_easy_read: bool
-) -> Tuple[Optional[Dict[str, Any]], Optional[str], str]:
-    """Call Gemini API and return structured JSON"""
+def hash_api_key(api_key: str) -> str:
+    """Short, non-reversible fingerprint of an API key for use as a cache key"""
+    return hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+
+# Serialises genai.configure() + client binding across concurrent sessions
+_GENAI_CONFIGURE_LOCK = threading.Lock()
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_generative_model(api_key_hash: str, model_name: str, _api_key: str):
+    """Shared GenerativeModel per (key, model); keyed on the key hash, never the raw key"""
+    # Imported on first use: the SDK (gRPC + protobuf) is slow to load and only needed for analysis
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
     
+    # configure() is process-global and the model only picks up a client on its first call,
+    # so bind this key's client now, before another session can reconfigure
+    with _GENAI_CONFIGURE_LOCK:
+        genai.configure(api_key=_api_key)
+        model = genai.GenerativeModel(model_name, generation_config=GENERATION_CONFIG)
+        # Private SDK attribute (requirements pin the tested range); never fall back to the global client
+        if not hasattr(model, "_client"):
+            raise RuntimeError("Unsupported google-generativeai version: GenerativeModel has no _client")
+        model._client = genai_client.get_default_generative_client()
+    return model
+
+@functools.lru_cache(maxsize=64)
+def build_prompt_instructions(sections_list_keys: tuple, max_words: int, user_prompt: str, is_easy_read: bool) -> str:
+    """Prompt text ahead of the transcript; identical for every part of a run, so built once"""
     sections_str = ", ".join(sections_list_keys)
-    
-    highlighting_instruction = (
-        "4. **Highlighting:** Wrap 2-4 critical words in <hl>text</hl> tags."
-        if is_easy_read else
-        "4. **NO special tags:** Use plain text only."
-    )
-    
-    prompt_instructions = SYSTEM_PROMPT + f"""
-{highlighting_instruction}
+    return SYSTEM_PROMPT + f"""
+{HIGHLIGHTING_INSTRUCTIONS[is_easy_read]}
 5. Target total length: ~{max_words} words across all sections
 6. Extract ONLY these categories: {sections_str}
 
 USER PREFERENCES: {user_prompt}
 """
+
+class AnalysisError(Exception):
+    """Analysis failure; raised rather than returned so failures are never cached"""
+
+class EmptySectionsError(AnalysisError):
+    """Every section came back empty; propagated so multi-part runs can skip the part instead of failing"""
+
+ANALYSIS_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Survives server restarts and is shared across sessions; size-bounded with per-entry expiry,
+# which Streamlit's persist="disk" offers neither of
+ANALYSIS_DISK_CACHE = diskcache.Cache(
+    str(Path(tempfile.gettempdir()) / "notes_llm_cache"), size_limit=2**30
+)
+
+@st.cache_data(ttl=ANALYSIS_CACHE_TTL_SECONDS, show_spinner=False, max_entries=128)
+def analyze_transcript_cached(
+    prompt_hash: str, 
+    model_name: str, 
+    _api_key: str, 
+    _full_prompt: str
+) -> Dict[str, Any]:
+    """Gemini call + parsing, cached on the full-prompt fingerprint (underscored args aren't hashed)"""
     
-    transcript_json = json.dumps(transcript_segments, indent=2)
-    full_prompt = f"{prompt_instructions}\n\nTRANSCRIPT DATA:\n{transcript_json}"
-    
-    if not api_key:
-        return None, "API Key Missing", full_prompt
+    disk_key = f"{model_name}|{prompt_hash}"
+    cached = ANALYSIS_DISK_CACHE.get(disk_key)
+    if cached is not None:
+        return cached
     
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(model_name)
+        model = get_generative_model(hash_api_key(_api_key), model_name, _api_key)
         
-        response = model.generate_content(full_prompt)
-        response_text = extract_gemini_text(response)
+        # Stream so we can stop reading as soon as the JSON object is complete
+        response = model.generate_content(_full_prompt, stream=True)
+        response_text = collect_streamed_text(response)
         
         if not response_text:
-            return None, "Empty API response", full_prompt
-        
-        print(f"\n{'='*60}")
-        print(f"RAW API RESPONSE (first 800 chars):\n{response_text[:800]}")
-        print(f"{'='*60}\n")
+            raise AnalysisError("Empty API response")
         
-        json_str = extract_clean_json(response_text)
-        if not json_str:
-            return None, f"No valid JSON found in response", full_prompt
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("RAW API RESPONSE (first 800 chars):\n%s", response_text[:800])
         
-        json_data = json.loads(json_str)
+        # JSON mode normally returns a bare object; only fall back to extraction when it doesn't
+        try:
+            json_data = json_loads(response_text)
+        except json.JSONDecodeError:
+            json_data = extract_json_object(response_text)
+            if json_data is None:
+                raise AnalysisError("No valid JSON found in response")
         
-        def to_snake_case(s):
-            s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', s)
-            return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+        if not isinstance(json_data, dict):
+            raise AnalysisError("Response JSON is not an object")
         
-        json_data = {to_snake_case(k): v for k, v in json_data.items()}
+        # Rebuild rather than rename in place: pop/reinsert would move renamed sections to the end,
+        # and per-part PDFs follow dict order. The usual all-snake_case response is left untouched
+        if not all(key.islower() for key in json_data):
+            json_data = {to_snake_case(k): v for k, v in json_data.items()}
         
+        # Normalize section types and look for any content in the same pass
+        has_content = False
         for key in EXPECTED_KEYS:
             if key not in json_data:
                 json_data[key] = "" if key == "main_subject" else []
-            elif key != "main_subject" and not isinstance(json_data[key], list):
-                json_data[key] = [json_data[key]] if json_data[key] else []
+            elif key != "main_subject":
+                if not isinstance(json_data[key], list):
+                    json_data[key] = [json_data[key]] if json_data[key] else []
+                has_content = has_content or bool(json_data[key])
         
-        print(f"✅ EXTRACTED KEYS: {list(json_data.keys())}")
-        for k, v in json_data.items():
-            if k != "main_subject":
-                print(f"   {k}: {len(v)} items")
+        if not has_content:
+            raise EmptySectionsError("Model returned all-empty sections; retry with a different prompt.")
         
-        return json_data, None, full_prompt
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("EXTRACTED KEYS: %s", list(json_data.keys()))
+            for k, v in json_data.items():
+                if k != "main_subject":
+                    logger.debug("   %s: %d items", k, len(v))
         
+    except AnalysisError:
+        raise
     except json.JSONDecodeError as e:
-        return None, f"JSON Parse Error: {e}", full_prompt
+        raise AnalysisError(f"JSON Parse Error: {e}")
     except Exception as e:
-        return None, f"API Error: {e}", full_prompt
+        raise AnalysisError(f"API Error: {e}")
+    
+    ANALYSIS_DISK_CACHE.set(disk_key, json_data, expire=ANALYSIS_CACHE_TTL_SECONDS)
+    return json_data
+
+def run_analysis_and_summarize(
+    api_key: str, 
+    transcript_segments: List[Dict], 
+    max_words: int, 
+    sections_list_keys: list, 
+    user_prompt: str, 
+    model_name: str, 
+    is_easy_read: bool
+) -> Tuple[Optional[Dict[str, Any]], Optional[str], str]:
+    """Call Gemini API and return structured JSON; raises EmptySectionsError if there was nothing to extract"""
+    
+    # Nothing to send without a key; don't build the transcript-sized prompt
+    if not api_key:
+        return None, "API Key Missing", ""
+    
+    # Compact, raw UTF-8 (no \uXXXX escapes) for fewer prompt tokens
+    transcript_json = json_dumps_bytes(transcript_segments).decode()
+    
+    sections_list_keys = tuple(sections_list_keys)
+    prompt_instructions = build_prompt_instructions(sections_list_keys, max_words, user_prompt, is_easy_read)
+    # Built outside the cache so only the notes, not the transcript-sized prompt, are persisted
+    full_prompt = f"{prompt_instructions}\n\nTRANSCRIPT DATA:\n{transcript_json}"
+    # Fingerprint the whole prompt plus generation config, so prompt or config edits miss stale entries
+    prompt_hash = hashlib.blake2b(
+        json_dumps_bytes(GENERATION_CONFIG) + full_prompt.encode(), digest_size=16
+    ).hexdigest()
+    
+    try:
+        json_data = analyze_transcript_cached(
+            prompt_hash, model_name, _api_key=api_key, _full_prompt=full_prompt
+        )
+    except EmptySectionsError:
+        raise
+    except AnalysisError as e:
+        return None, str(e), full_prompt
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        empty_sections = [k for k in sections_list_keys if not json_data.get(k)]
+        if empty_sections:
+            logger.debug("Requested sections returned empty: %s", empty_sections)
+    
+    return json_data, None, full_prompt
 
 # --- CUSTOM FLOWABLE FOR SECTION HEADER ---
 class SectionHeader(Flowable):
@@ -318,8 +543,9 @@ class NumberedCanvas(pdfcanvas.Canvas):
 
 # --- PDF GENERATION ---
 
+@functools.lru_cache(maxsize=2)
 def create_custom_styles(is_easy_read: bool):
-    """Create professional PDF styles with proper spacing"""
+    """Create professional PDF styles with proper spacing (built once per mode; treat as read-only)"""
     styles = getSampleStyleSheet()
     
     # Title style
@@ -382,24 +608,96 @@ def create_custom_styles(is_easy_read: bool):
         textColor=COLORS['link'],
         fontName='Helvetica-Bold',
         alignment=TA_LEFT,
-        backColor=HexColor("#E3F2FD"),
+        backColor=COLORS['bg_section'],
         borderPadding=2,
         borderRadius=3
     ))
     
     return styles
 
+# Timestamp link colour, resolved once rather than per item
+LINK_COLOR = MARKUP_COLORS["link"]
+
+# Enhanced highlighting: yellow background + bold orange text
+HIGHLIGHT_OPEN = (
+    f'<span backcolor="{MARKUP_COLORS["bg_highlight"]}" color="{MARKUP_COLORS["highlight_text"]}"><b>'
+)
+HIGHLIGHT_CLOSE = '</b></span>'
+
 def process_highlight_text(text: str, is_easy_read: bool) -> str:
     """Convert <hl> tags to ReportLab formatting with improved contrast"""
-    if not is_easy_read:
-        return re.sub(r'<hl>(.*?)</hl>', r'\1', text)
-    
-    # Enhanced highlighting: yellow background + bold orange text
-    return re.sub(
-        r'<hl>(.*?)</hl>',
-        r'<span backcolor="#FFF59D" color="#E65100"><b>\1</b></span>',
-        text
-    )
+    # Most items carry no highlight tags; a substring scan is all they need
+    if '<hl>' not in text:
+        return text
+    
+    open_tag, close_tag = (HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE) if is_easy_read else ('', '')
+    
+    # Plain str.find scan; an unterminated <hl> is left as-is
+    parts = []
+    pos = 0
+    while True:
+        start = text.find('<hl>', pos)
+        if start < 0:
+            break
+        end = text.find('</hl>', start + 4)
+        if end < 0:
+            break
+        parts.extend((text[pos:start], open_tag, text[start + 4:end], close_tag))
+        pos = end + 5
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+def build_item_markup(text: str, timestamp, base_url: Optional[str], is_easy_read: bool) -> str:
+    """Build Paragraph markup for one item, with its clickable timestamp appended"""
+    formatted_text = process_highlight_text(text, is_easy_read)
+    if timestamp and base_url:
+        seconds = int(timestamp)
+        # ✅ clickable timestamp
+        formatted_text += (
+            f' <a href="{base_url}&t={seconds}s" color="{LINK_COLOR}">'
+            f'<font size="8"><b>[{format_timestamp(seconds)}]</b></font></a>'
+        )
+    return formatted_text
+
+def render_topic_breakdown(section_content: list, styles, body_style, base_url: Optional[str], is_easy_read: bool) -> list:
+    """Render nested topic -> details items into flowables"""
+    section_story = []
+    # Loop-invariant lookups bound once per section
+    append = section_story.append
+    topic_style = styles['TopicHead']
+    for item in section_content:
+        topic_name = item.get('topic', '')
+        if topic_name:
+            append(Paragraph(f"• {topic_name}", topic_style))
+        
+        for detail in item.get('details', []):
+            detail_text = get_content_text(detail)
+            if not detail_text.strip():
+                continue
+            
+            timestamp = detail.get('time') if isinstance(detail, dict) else None
+            markup = build_item_markup(detail_text, timestamp, base_url, is_easy_read)
+            append(Paragraph(markup, body_style))
+    return section_story
+
+def render_flat_section(section_content: list, styles, body_style, base_url: Optional[str], is_easy_read: bool) -> list:
+    """Render a flat list of items into bulleted flowables"""
+    section_story = []
+    append = section_story.append
+    for item in section_content:
+        content_text = get_content_text(item)
+        if not content_text.strip():
+            continue
+        
+        timestamp = item.get('time') if isinstance(item, dict) else None
+        markup = build_item_markup(content_text, timestamp, base_url, is_easy_read)
+        append(Paragraph(f"• {markup}", body_style))
+    return section_story
+
+# Sections with a non-flat layout; everything else uses render_flat_section
+SECTION_RENDERERS = {
+    'topic_breakdown': render_topic_breakdown,
+}
 
 def save_to_pdf(
     data: dict, 
@@ -436,67 +734,29 @@ def save_to_pdf(
     story.append(Paragraph(video_title, styles['CustomTitle']))
     story.append(Spacer(1, 0.25*inch if is_easy_read else 0.15*inch))
     
+    # Spacing is fixed for the whole document; work it out once, not per section
+    header_gap = 0.15*inch if is_easy_read else 0.1*inch
+    section_gap = 0.2*inch if is_easy_read else 0.12*inch
+    
+    # Only non-empty list sections get a heading; filter them up front
+    sections = [
+        (key, content) for key, content in data.items()
+        if key != "main_subject" and isinstance(content, list) and content
+    ]
+    
     # Process each section
-    for section_key, section_content in data.items():
-        if section_key == "main_subject" or not isinstance(section_content, list) or not section_content:
-            continue
-        
-        heading = section_key.replace("_", " ").title()
-        icon = SECTION_ICONS.get(section_key, "📌")
+    for section_key, section_content in sections:
+        labels = SECTION_LABELS.get(section_key)
+        if labels is None:
+            labels = (section_key.replace("_", " ").title(), "📌")
+        heading, icon = labels
         
         story.append(SectionHeader(heading, icon, is_easy_read=is_easy_read))
-        story.append(Spacer(1, 0.15*inch if is_easy_read else 0.1*inch))
-        
-        # --- Nested Topic Breakdown ---
-        if section_key == 'topic_breakdown':
-            for item in section_content:
-                topic_name = item.get('topic', '')
-                if topic_name:
-                    story.append(Paragraph(f"• {topic_name}", styles['TopicHead']))
-                
-                for detail in item.get('details', []):
-                    detail_text = get_content_text(detail)
-                    if not detail_text.strip():
-                        continue
-                    
-                    formatted_text = process_highlight_text(detail_text, is_easy_read)
-                    
-                    timestamp = detail.get('time')
-                    if timestamp and base_url:
-                        link_url = f"{base_url}&t={int(timestamp)}s"
-                        ts_formatted = format_timestamp(int(timestamp))
-                        # ✅ clickable timestamp
-                        formatted_text += (
-                            f' <a href="{link_url}" color="#1976D2">'
-                            f'<font size="8"><b>[{ts_formatted}]</b></font></a>'
-                        )
-                    
-                    story.append(Paragraph(formatted_text, body_style))
-            
-            story.append(Spacer(1, 0.2*inch if is_easy_read else 0.12*inch))
-            continue
-        
-        # --- Flat Sections ---
-        for item in section_content:
-            content_text = get_content_text(item)
-            if not content_text.strip():
-                continue
-            
-            formatted_text = process_highlight_text(content_text, is_easy_read)
-            
-            timestamp = item.get('time') if isinstance(item, dict) else None
-            if timestamp and base_url:
-                link_url = f"{base_url}&t={int(timestamp)}s"
-                ts_formatted = format_timestamp(int(timestamp))
-                # ✅ clickable timestamp
-                formatted_text += (
-                    f' <a href="{link_url}" color="#1976D2">'
-                    f'<font size="8"><b>[{ts_formatted}]</b></font></a>'
-                )
-            
-            story.append(Paragraph(f"• {formatted_text}", body_style))
+        story.append(Spacer(1, header_gap))
         
-        story.append(Spacer(1, 0.2*inch if is_easy_read else 0.12*inch))
+        render_section = SECTION_RENDERERS.get(section_key, render_flat_section)
+        story.extend(render_section(section_content, styles, body_style, base_url, is_easy_read))
+        story.append(Spacer(1, section_gap))
     
     # Build PDF with custom canvas
     doc.build(
@@ -505,4 +765,4 @@ def save_to_pdf(
     )
     output.seek(0)
     
-    print(f"\n✅ PDF generated successfully ({len(story)} elements, Easy Read: {is_easy_read}, Clickable timestamps enabled)")
\ No newline at end of file
+    logger.debug("PDF generated successfully (%d elements, Easy Read: %s)", len(story), is_easy_read)